@@ -0,0 +1,11 @@
+"""Constants shared by deqode.chp_sim and its compiled kernels in
+deqode._kernels. They live here so that chp_sim can use them without
+importing numba."""
+
+# Number of tableau columns packed into each machine word.
+WORD_SIZE = 64
+
+# Opcodes of the [opcode, t0, t1] instructions executed by run.
+OP_H = 0
+OP_CX = 1
+OP_M = 2
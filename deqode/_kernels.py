@@ -0,0 +1,189 @@
+"""Numba-compiled kernels for the CHP tableau in deqode.chp_sim.
+
+Every kernel acts in place on the bit-packed x words X, z words Z and sign
+bits r of a tableau on n qubits. Qubit q of row i is stored in bit
+q % WORD_SIZE of word X[i, q // WORD_SIZE] (respectively Z).
+
+There is no separate code path for small tableaus: when n <= WORD_SIZE each
+row is a single word, the gate kernels touch one word per row and the word
+loop in rowsum runs once, which is what a kernel specialized on n would do."""
+
+import numpy as np
+from numba import njit, types
+from numba.extending import intrinsic
+from deqode._constants import WORD_SIZE, OP_H, OP_CX, OP_M
+
+@njit(cache=True)
+def _bit(A, i, q):
+    """Read the bit of qubit q in row i of X or Z as a 0/1 word."""
+
+    return (A[i, q // WORD_SIZE] >> np.uint64(q % WORD_SIZE)) & np.uint64(1)
+
+
+@njit(cache=True)
+def _flip(A, i, q, v):
+    """XOR the 0/1 word v into the bit of qubit q in row i of X or Z."""
+
+    A[i, q // WORD_SIZE] ^= v << np.uint64(q % WORD_SIZE)
+
+
+@intrinsic
+def _popcount(typingctx, v):
+    """Count the set bits of a uint64 word.
+
+    This lowers to LLVM's ctpop, which Numba compiles for the host CPU, so it
+    becomes a single POPCNT instruction (or a vectorized popcount inside the
+    rowsum loop) wherever the hardware supports one."""
+
+    if v != types.uint64:
+        return None
+
+    def codegen(context, builder, signature, args):
+        return builder.ctpop(args[0])
+
+    return types.int64(types.uint64), codegen
+
+
+@njit(cache=True)
+def rowsum(X, Z, r, h, i, n):
+    """Left-multiply row h by row i."""
+
+    # Sum g over all qubits a word at a time. g is nonzero exactly where the two
+    # Paulis anticommute, and there it is -1 for (Y, X), (X, Z) and (Z, Y) and +1
+    # otherwise. Over GF(2) the anticommuting positions are x1 z2 + z1 x2, and
+    # the -1 cases among them are x1 + z1 + x2 + z2 + x1 z2, so the sum is
+    # popcount(anti) - 2 popcount(neg).
+    gsum = 0
+    for w in range(X.shape[1]):
+        x1 = X[i, w]
+        z1 = Z[i, w]
+        x2 = X[h, w]
+        z2 = Z[h, w]
+        x1z2 = x1 & z2
+        anti = x1z2 ^ (z1 & x2)
+        x = x1 ^ x2
+        z = z1 ^ z2
+        neg = anti & (x ^ z ^ x1z2)
+        gsum += _popcount(anti) - 2 * _popcount(neg)
+        # x_hj <- x_ij XOR x_hj and z_hj <- z_ij XOR z_hj
+        X[h, w] = x
+        Z[h, w] = z
+    # 2 r_i + 2 r_h = 2 (r_i XOR r_h) mod 4, so the sign bits are combined bitwise.
+    r[h] = ((((r[i] ^ r[h]) << 1) + gsum) & 3) != 0
+
+
+@njit(cache=True)
+def h(X, Z, r, a, n):
+    """Apply a Hadamard gate to qubit a."""
+
+    for i in range(2 * n):
+        x = _bit(X, i, a)
+        z = _bit(Z, i, a)
+        r[i] ^= np.uint8(x & z)
+        _flip(X, i, a, x ^ z)
+        _flip(Z, i, a, x ^ z)
+
+
+@njit(cache=True)
+def phase(X, Z, r, a, n):
+    """Apply an S gate to qubit a."""
+
+    for i in range(2 * n):
+        x = _bit(X, i, a)
+        z = _bit(Z, i, a)
+        r[i] ^= np.uint8(x & z)
+        _flip(Z, i, a, x)
+
+
+@njit(cache=True)
+def cnot(X, Z, r, a, b, n):
+    """Apply a CNOT gate controlled by qubit a and acting on qubit b."""
+
+    for i in range(2 * n):
+        x_a = _bit(X, i, a)
+        x_b = _bit(X, i, b)
+        z_a = _bit(Z, i, a)
+        z_b = _bit(Z, i, b)
+        r[i] ^= np.uint8(x_a & z_b & (x_b ^ z_a ^ np.uint64(1)))
+        _flip(X, i, b, x_a)
+        _flip(Z, i, a, z_b)
+
+
+@njit(cache=True)
+def pivot(X, a, n):
+    """Find the first stabilizer row p in [n, 2n) with x_pa = 1, or -1 if there is none."""
+
+    for p in range(n, 2 * n):
+        if _bit(X, p, a):
+            return p
+    return -1
+
+
+@njit(cache=True)
+def measure_random(X, Z, r, a, p, n, outcome):
+    """Collapse qubit a onto outcome, given the pivot row p from pivot."""
+
+    # Rows n..p-1 have x_ia = 0 since p is the first stabilizer row with x_pa = 1.
+    for i in range(n):
+        if _bit(X, i, a):
+            rowsum(X, Z, r, i, p, n)
+    for i in range(p + 1, 2 * n):
+        if _bit(X, i, a):
+            rowsum(X, Z, r, i, p, n)
+    for w in range(X.shape[1]):
+        X[p - n, w] = X[p, w]
+        Z[p - n, w] = Z[p, w]
+        X[p, w] = 0
+        Z[p, w] = 0
+    r[p - n] = r[p]
+    r[p] = outcome
+    _flip(Z, p, a, np.uint64(1))
+
+
+@njit(cache=True)
+def measure_deterministic(X, Z, r, a, n):
+    """Compute the outcome of measuring qubit a when it is not random."""
+
+    for w in range(X.shape[1]):
+        X[2 * n, w] = 0
+        Z[2 * n, w] = 0
+    r[2 * n] = 0
+    for i in range(n):
+        if _bit(X, i, a):
+            rowsum(X, Z, r, 2 * n, i + n, n)
+    return r[2 * n] != 0
+
+
+@njit(cache=True)
+def measure(X, Z, r, a, n, coin):
+    """Measure qubit a, using coin as the outcome if it is random."""
+
+    # Does there exist a p in [n+1, 2n] s.t. x_pa = 1?
+    p = pivot(X, a, n)
+    if p >= 0:
+        # Measurement result is random.
+        measure_random(X, Z, r, a, p, n, coin)
+        return coin
+    else:
+        # Measurement result is deterministic.
+        return measure_deterministic(X, Z, r, a, n)
+
+
+@njit(cache=True)
+def run(program, X, Z, r, n, coins):
+    """Execute a compiled program of [opcode, t0, t1] rows, returning the measurement results.
+
+    coins holds one pre-drawn random bit per OP_M instruction."""
+
+    results = np.empty(coins.shape[0], dtype=np.bool_)
+    k = 0
+    for g in range(program.shape[0]):
+        op = program[g, 0]
+        if op == OP_H:
+            h(X, Z, r, program[g, 1], n)
+        elif op == OP_CX:
+            cnot(X, Z, r, program[g, 1], program[g, 2], n)
+        elif op == OP_M:
+            results[k] = measure(X, Z, r, program[g, 1], n, coins[k])
+            k += 1
+    return results
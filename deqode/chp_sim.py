@@ -1,16 +1,72 @@
 """A CHP-style simulator for stabilizer circuits.
 See https://journals.aps.org/pra/abstract/10.1103/PhysRevA.70.052328"""
 
-from typing import List
-import random
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional
 import numpy as np
-import stim
+from deqode._constants import WORD_SIZE, OP_H, OP_CX, OP_M
+
+if TYPE_CHECKING:
+    import stim
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """Pack the columns of a 2D boolean array into little-endian uint64 words."""
+
+    words = -(-bits.shape[1] // WORD_SIZE)
+    packed = np.zeros((bits.shape[0], 8 * words), dtype=np.uint8)
+    packed[:, :-(-bits.shape[1] // 8)] = np.packbits(bits, axis=1, bitorder="little")
+    return packed.view("<u8").astype(np.uint64, copy=False)
+
+
+def _unpack(words: np.ndarray, ncols: int) -> np.ndarray:
+    """Inverse of _pack: expand uint64 words back into ncols boolean columns."""
+
+    bytes_ = np.ascontiguousarray(words, dtype="<u8").view(np.uint8)
+    return np.unpackbits(bytes_, axis=1, count=ncols, bitorder="little").view(bool)
+
+
+def _check_qubits(n: int, *qubits: int) -> None:
+    """Raise if any of the qubits is outside range(n). The kernels do no bounds
+    checking of their own, so this must happen before they are called."""
+
+    for q in qubits:
+        if not 0 <= q < n:
+            raise IndexError(f"Qubit {q} is out of range for a tableau on {n} qubits.")
+
+
+class _Coins:
+    """Fair coin flips for random measurement outcomes, drawn from a numpy
+    Generator in batches so that each flip is just a list pop."""
+
+    def __init__(self, rng: np.random.Generator, batch: int = 1024):
+        self._rng = rng
+        self._batch = batch
+        self._bits = []
+
+    def flip(self) -> bool:
+        if not self._bits:
+            self._bits = self._rng.integers(0, 2, size=self._batch, dtype=np.uint8).astype(bool).tolist()
+        return self._bits.pop()
+
+    def flips(self, k: int) -> np.ndarray:
+        return self._rng.integers(0, 2, size=k, dtype=np.uint8).astype(bool)
+
+
+# Shared by every tableau that is not given its own generator.
+_COINS = _Coins(np.random.default_rng())
 
 
 class StabilizerTableau:
 
-    def __init__(self, bmatrix):
-        """Initializes a tableau from the binary matrix form."""
+    def __init__(self, bmatrix, rng: Optional[np.random.Generator] = None):
+        """Initializes a tableau from the binary matrix form.
+
+        Internally the tableau is split into the x bits _x, the z bits _z and the
+        sign bits _r. The x and z columns are bit-packed, WORD_SIZE to a uint64
+        word, so that each gate updates every row with a few word-wide
+        operations. Random measurement outcomes are drawn from rng, or from a
+        shared module-level generator if it is None."""
 
         if bmatrix.shape[0] % 2 == 0:
             raise ValueError("Matrix must have an odd number of rows!")
@@ -20,129 +76,141 @@ class StabilizerTableau:
                 f"Matrix has shape {bmatrix.shape}, but tableau should have shape (2 * n + 1) * (2 * n + 1)."
             )
         
-        self._bmatrix = bmatrix
+        bmatrix = np.asarray(bmatrix, dtype=bool)
+        n = (bmatrix.shape[0] - 1) // 2
+        self._x = _pack(bmatrix[:, :n])
+        self._z = _pack(bmatrix[:, n:-1])
+        self._r = bmatrix[:, -1].astype(np.uint8)
+        self._coins = _COINS if rng is None else _Coins(rng)
     
     @property
     def matrix(self):
-        return self._bmatrix
+        """The tableau in the unpacked (2 * n + 1) * (2 * n + 1) boolean form."""
+
+        n = self.nqubits
+        bmatrix = np.empty((2 * n + 1, 2 * n + 1), dtype=bool)
+        bmatrix[:, :n] = _unpack(self._x, n)
+        bmatrix[:, n:-1] = _unpack(self._z, n)
+        bmatrix[:, -1] = self._r
+        return bmatrix
     
+    @property
+    def _backend(self):
+        """The compiled kernel module. It is imported on first use rather than at
+        module level since importing numba dominates the import time of chp_sim."""
+
+        from deqode import _kernels
+        return _kernels
+
     @property
     def nqubits(self):
-        return (self._bmatrix.shape[0] - 1) // 2 
+        return (self._r.shape[0] - 1) // 2 
     
-    def zero(nqubits: int):
+    def zero(nqubits: int, rng: Optional[np.random.Generator] = None):
         """Initialize the all-zero state."""
 
-        bmatrix = np.zeros((2 * nqubits + 1, 2 * nqubits + 1), dtype=bool)
-        for i in range(2 * nqubits):
-            bmatrix[i, i] = True
-        return StabilizerTableau(bmatrix)
+        # Set x_ii and z_(n+i)i for every qubit i in one vectorized assignment.
+        nw = -(-nqubits // WORD_SIZE)
+        x = np.zeros((2 * nqubits + 1, nw), dtype=np.uint64)
+        z = np.zeros_like(x)
+        qubits = np.arange(nqubits)
+        bits = np.uint64(1) << (qubits % WORD_SIZE).astype(np.uint64)
+        x[qubits, qubits // WORD_SIZE] = bits
+        z[qubits + nqubits, qubits // WORD_SIZE] = bits
+        return StabilizerTableau._from_packed(x, z, np.zeros(2 * nqubits + 1, dtype=np.uint8), rng)
+
+    def _from_packed(x: np.ndarray, z: np.ndarray, r: np.ndarray, rng: Optional[np.random.Generator] = None):
+        """Wrap already-packed words and sign bits without unpacking them."""
+
+        tableau = StabilizerTableau.__new__(StabilizerTableau)
+        tableau._x = x
+        tableau._z = z
+        tableau._r = r
+        tableau._coins = _COINS if rng is None else _Coins(rng)
+        return tableau
     
     def to_stim_paulis(self) -> List[stim.PauliString]:
         """Convert the stabilizers into Stim-type Pauli strings."""
 
-        raise NotImplementedError()
-    
-    def rowsum(self, h: int, i: int):
+        # stim is imported here rather than at module level since it is slow to
+        # import and only needed for this conversion.
+        import stim
 
-        def g(x1: bool, z1: bool, x2: bool, z2: bool) -> int:
-            if (not x1) and (not z1):
-                return 0
-            elif x1 and z1:
-                return int(z2) - int(x2)
-            elif x1 and (not z1):
-                return int(z2) * (2 * int(x2) - 1)
-            else:
-                return int(x2) * (1 - 2 * int(z2))
-        
-        # Set the sign bit conditioned on the current signs and the sum of g's.
-        gsum = 0
-        for j in range(self.nqubits):
-            gsum += g(
-                self._bmatrix[i, j], self._bmatrix[i, j + self.nqubits],
-                self._bmatrix[h, j], self._bmatrix[h, j + self.nqubits]
+        n = self.nqubits
+        bmatrix = self.matrix
+        return [
+            stim.PauliString.from_numpy(
+                xs=bmatrix[p, :n], zs=bmatrix[p, n:2 * n], sign=-1 if bmatrix[p, -1] else 1
             )
-        ri = int(self._bmatrix[i, -1])
-        rh = int(self._bmatrix[h, -1])
-        self._bmatrix[h, -1] = (2 * ri + 2 * rh + gsum) % 4 != 0
-        
-        # Set x_hj and z_hj from XOR's.
-        for j in range(self.nqubits):
-            # x_hj <- x_ij XOR x_hj
-            self._bmatrix[h, j] = self._bmatrix[i, j] ^ self._bmatrix[h, j]
-            # z_hj <- z_ij XOR z_hj
-            self._bmatrix[h, j + self.nqubits] = self._bmatrix[i, j + self.nqubits] \
-                ^ self._bmatrix[h, j + self.nqubits]
+            for p in range(n, 2 * n)
+        ]
+
+    def rowsum(self, h: int, i: int):
+        """Left-multiply row h by row i, tracking the sign in r_h."""
+
+        m = self._r.shape[0]
+        for row in (h, i):
+            if not 0 <= row < m:
+                raise IndexError(f"Row {row} is out of range for a tableau with {m} rows.")
+
+        n = self._r.shape[0] // 2
+        self._backend.rowsum(self._x, self._z, self._r, h, i, n)
 
     def h(self, a: int) -> None:
         """Apply a Hadamard gate to qubit a."""
 
-        assert a in range(0, self.nqubits)
+        n = self._r.shape[0] // 2
+        _check_qubits(n, a)
 
-        for i in range(2 * self.nqubits):
-            # r_i <- r_i oplus x_ia z_ia
-            self._bmatrix[i, -1] = self._bmatrix[i, -1] ^ (self._bmatrix[i, a] * self._bmatrix[i, a+self.nqubits])
-            # Swap x_ia and z_ia
-            temp = self._bmatrix[i, a] # x_ia
-            self._bmatrix[i, a] = self._bmatrix[i, a+self.nqubits]
-            self._bmatrix[i, a+self.nqubits] = temp
+        self._backend.h(self._x, self._z, self._r, a, n)
 
     def phase(self, a: int) -> None:
         """Apply an S gate to qubit a."""
 
-        assert a in range(0, self.nqubits)
+        n = self._r.shape[0] // 2
+        _check_qubits(n, a)
 
-        for i in range(2 * self.nqubits):
-            # r_i <- r_i oplus x_ia z_ia
-            self._bmatrix[i, -1] = self._bmatrix[i, -1] ^ (self._bmatrix[i, a] * self._bmatrix[i, a+self.nqubits])
-            # z_ia <- z_ia oplus x_ia
-            self._matrix[i, a+self.nqubits] = self._matrix[i, a] ^ self._matrix[i, a+self.nqubits]
+        self._backend.phase(self._x, self._z, self._r, a, n)
     
     def cnot(self, a: int, b: int) -> None:
         """Apple a CNOT gate controlled by qubit a and acting on qubit b."""
 
-        assert a in range(0, self.nqubits)
-        assert b in range(0, self.nqubits)
-        assert a != b
-
-        for i in range(2 * self.nqubits):
-            x_ia = self._bmatrix[i, a]
-            x_ib = self._bmatrix[i, b]
-            z_ia = self._bmatrix[i, a+self.nqubits]
-            z_ib = self._bmatrix[i, b+self.nqubits]
-            # r_i <- r_i oplus x_ia z_ib (x_ib oplus z_ia oplus 1)
-            self._bmatrix[i, -1] = self._bmatrix[i, -1] ^ x_ia & z_ib & (x_ib ^ z_ia ^ 1)
-            # x_ib <- x_ib oplus x_ia
-            self._bmatrix[i, b] = x_ib ^ x_ia
-            # z_ia <- z_ia oplus z_ib
-            self._bmatrix[i, a+self.nqubits] = z_ia ^ z_ib
+        n = self._r.shape[0] // 2
+        _check_qubits(n, a, b)
+        if a == b:
+            raise ValueError(f"CNOT control and target must differ, got {a} for both.")
+
+        self._backend.cnot(self._x, self._z, self._r, a, b, n)
     
     def measure(self, a: int) -> bool:
         """Measure qubit a."""
 
-        assert a in range(0, self.nqubits)
-
-        # Does there exist a p in [n+1, 2n] s.t. x_pa = 1?
-        p_exists = False
-        for p in range(self.nqubits, 2 * self.nqubits):
-            if self._bmatrix[p, a]:
-                p_exists = True
-                break
-        if p_exists:
-            # Measurement result is random.
-            for i in range(2 * self.nqubits):
-                if i != p and self._bmatrix[i, a]:
-                    self.rowsum(i, p)
-            self._bmatrix[p - self.nqubits, :] = self._bmatrix[p, :].copy()
-            self._bmatrix[p, :] = np.zeros(2 * self.nqubits + 1)
-            r = random.random()
-            self._bmatrix[p, -1] = r > 0.5
-            self._bmatrix[p, a + self.nqubits] = True
-            return self._bmatrix[p, -1]
-        else:
-            # Measurement result is deterministic.
-            self._bmatrix[-1, :] = np.zeros(self._bmatrix.shape[1], dtype=bool)
-            for i in range(self.nqubits):
-                if self._bmatrix[i, a]:
-                    self.rowsum(2 * self.nqubits, i + self.nqubits)
-            return self._bmatrix[-1, -1]
\ No newline at end of file
+        n = self._r.shape[0] // 2
+        _check_qubits(n, a)
+
+        # The coin is only used as the outcome if the result is random.
+        return bool(self._backend.measure(self._x, self._z, self._r, a, n, self._coins.flip()))
+
+    def run(self, program: np.ndarray) -> np.ndarray:
+        """Execute a compiled program in place and return its measurement results.
+
+        program is an (n_gates, 3) int32 array whose rows are [opcode, t0, t1],
+        with opcodes OP_H, OP_CX and OP_M and t1 = -1 for single-qubit gates. The
+        whole program runs inside one compiled loop."""
+
+        n = self._r.shape[0] // 2
+        ops = program[:, 0]
+        unknown = ~np.isin(ops, (OP_H, OP_CX, OP_M))
+        if np.any(unknown):
+            raise ValueError(f"Unknown opcode {ops[unknown][0]} in program.")
+        cx = program[ops == OP_CX]
+        targets = np.concatenate((program[:, 1], cx[:, 2]))
+        out_of_range = (targets < 0) | (targets >= n)
+        if np.any(out_of_range):
+            raise IndexError(f"Qubit {targets[out_of_range][0]} is out of range for a tableau on {n} qubits.")
+        same = cx[:, 1] == cx[:, 2]
+        if np.any(same):
+            raise ValueError(f"CNOT control and target must differ, got {cx[same][0, 1]} for both.")
+
+        coins = self._coins.flips(int(np.count_nonzero(ops == OP_M)))
+        return self._backend.run(program, self._x, self._z, self._r, n, coins)
@@ -1,13 +1,27 @@
+from itertools import groupby
+from typing import List, Optional
 import numpy as np
+import stim
 from deqode.chp_sim import StabilizerTableau
-from deqode.gate import Gate
+from deqode.gate import Gate, apply_many_to_stim
 
 class Circuit:
 
-    def __init__(self, nqubits: int):
+    def __init__(self, nqubits: int, rng: Optional[np.random.Generator] = None):
+        """Creates an empty circuit on nqubits qubits in the all-zero state.
+
+        Random measurement outcomes on both backends are drawn from rng, so a
+        seeded generator makes sampling reproducible. If it is None, they come
+        from unseeded generators."""
+
         self._nqubits = nqubits
-        self._tableau = StabilizerTableau.zero(nqubits)
+        self._rng = rng
+        self._tableau = StabilizerTableau.zero(nqubits, rng)
+        self._sim = stim.TableauSimulator(seed=self._stim_seed())
+        self._sim.set_num_qubits(nqubits)
         self._gates = []
+        self._nmeas = 0
+        self._program = None
     
     def __repr__(self):
         repr_str = ""
@@ -21,15 +35,74 @@ class Circuit:
         """Append a gate to the circuit."""
 
         self._gates.append(gate)
-    
-    def sample(self) -> np.ndarray:
-        """Get a bitstring from the circuit."""
+        self._nmeas += gate.is_measure
+        self._program = None
+
+    def _compile(self) -> np.ndarray:
+        """Lower the gates to an (n_gates, 3) int32 array of [opcode, t0, t1] rows.
+
+        The result is cached until the next append."""
 
-        results = []
+        if self._program is None:
+            self._program = np.array(self._gates, dtype=np.int32).reshape(-1, 3)
+        return self._program
+
+    def _stim_seed(self) -> Optional[int]:
+        """Draw a seed for a Stim simulator or sampler from the circuit's generator."""
+
+        return None if self._rng is None else int(self._rng.integers(2 ** 63))
+
+    def _to_stim_circuit(self) -> stim.Circuit:
+        """Convert the gates into a Stim circuit."""
+
+        circuit = stim.Circuit()
         for gate in self._gates:
-            if gate.is_measure:
-                result = gate.apply_to(self._tableau)
-                results.append(result)
-            else:
-                gate.apply_to(self._tableau)
-        return np.array(results)
\ No newline at end of file
+            gate.apply_to_stim_circuit(circuit)
+        return circuit
+    
+    def to_stim_paulis(self) -> List[stim.PauliString]:
+        """Get the stabilizers of the Stim simulator's current state."""
+
+        return self._sim.current_inverse_tableau().inverse().to_stabilizers()
+    
+    def sample(self, backend: str = "stim") -> np.ndarray:
+        """Get a bitstring from the circuit.
+
+        By default the gates are run on a Stim tableau simulator. Passing
+        backend="python" compiles them to an instruction stream and runs it on the
+        reference StabilizerTableau instead."""
+
+        if backend == "python":
+            return self._tableau.run(self._compile())
+        elif backend != "stim":
+            raise ValueError(f"Unknown backend {backend}. Expected 'stim' or 'python'.")
+
+        # Consecutive gates of the same type are applied as one batch.
+        results = np.empty(self._nmeas, dtype=bool)
+        k = 0
+        for _, run in groupby(self._gates, key=lambda gate: gate.opcode):
+            run = list(run)
+            outcomes = apply_many_to_stim(run, self._sim)
+            if run[0].is_measure:
+                results[k:k + len(run)] = outcomes
+                k += len(run)
+        return results
+
+    def sample_shots(self, n_shots: int, backend: str = "stim") -> np.ndarray:
+        """Sample the circuit n_shots times, each time starting from the all-zero state.
+
+        Unlike sample, this does not advance the circuit's own state. The results
+        are returned bit-packed as an (n_shots, ceil(nmeas / 8)) uint8 array, with
+        measurement k in bit k % 8 of byte k // 8, which np.unpackbits(...,
+        bitorder="little") undoes."""
+
+        if backend == "stim":
+            return self._to_stim_circuit().compile_sampler(seed=self._stim_seed()).sample(n_shots, bit_packed=True)
+        elif backend != "python":
+            raise ValueError(f"Unknown backend {backend}. Expected 'stim' or 'python'.")
+
+        program = self._compile()
+        results = np.empty((n_shots, self._nmeas), dtype=bool)
+        for shot in range(n_shots):
+            results[shot] = StabilizerTableau.zero(self._nqubits, self._rng).run(program)
+        return np.packbits(results, axis=1, bitorder="little")
@@ -1,68 +1,79 @@
-from typing import List
+from typing import List, NamedTuple
 import numpy as np
-from deqode.chp_sim import StabilizerTableau
+import stim
+from deqode.chp_sim import StabilizerTableau, OP_H, OP_CX, OP_M
 
-class Gate:
-    """A operation (either unitary or not) applied to a qubit."""
+# Names of the opcodes, which are also the names of the matching Stim instructions.
+_NAMES = {OP_H: "H", OP_CX: "CX", OP_M: "M"}
+
+_APPLY = {
+    OP_H: lambda tableau, gate: tableau.h(gate.t0),
+    OP_CX: lambda tableau, gate: tableau.cnot(gate.t0, gate.t1),
+    OP_M: lambda tableau, gate: tableau.measure(gate.t0),
+}
+
+
+class Gate(NamedTuple):
+    """A operation (either unitary or not) applied to a qubit.
+
+    Gates are plain (opcode, t0, t1) tuples, with t1 = -1 for single-qubit
+    operations, so a circuit's gate list is compact and compiles directly to
+    an instruction array. Build them with HadamardGate, CNOTGate and MeasureGate."""
+
+    opcode: int
+    t0: int
+    t1: int = -1
+
+    @property
+    def name(self):
+        return _NAMES[self.opcode]
 
-    def __init__(self, name: str, targets: List[int], is_noisy: bool, is_measure: bool):
-        self._name = name
-        self._targets = targets
-        self._is_noisy = is_noisy
-        self._is_measure = is_measure
-    
     @property
     def targets(self):
-        return self._targets
+        return [self.t0] if self.t1 < 0 else [self.t0, self.t1]
     
     @property
     def is_noisy(self):
-        return self._is_noisy
+        return False
     
     @property
     def is_measure(self):
-        return self._is_measure
+        return self.opcode == OP_M
     
     def __repr__(self):
-        return self._name + ' ' + ' '.join([str(t) for t in self._targets])
+        return self.name + ' ' + ' '.join([str(t) for t in self.targets])
 
     def apply_to(self, tableau: StabilizerTableau):
-        """Apply the gate to the tableau in place."""
+        """Apply the gate to the tableau in place, returning the outcome of a measurement."""
 
-        raise NotImplemented("This class does not impelement apply.")
+        return _APPLY[self.opcode](tableau, self)
 
+    def apply_to_stim_circuit(self, circuit: stim.Circuit):
+        """Append the gate to a Stim circuit."""
 
-class HadamardGate(Gate):
+        circuit.append(self.name, self.targets)
 
-    def __init__(self, target: int):
-        self._name = "H"
-        self._targets = [target]
-        self._is_noisy = False
-        self._is_measure = False
-    
-    def apply_to(self, tableau: StabilizerTableau):
-        tableau.h(self._targets[0])
 
+def HadamardGate(target: int) -> Gate:
+    return Gate(OP_H, target)
 
-class CNOTGate(Gate):
 
-    def __init__(self, ctrl: int, target: int):
-        self._name = "CX"
-        self._targets = [ctrl, target]
-        self._is_noisy = False
-        self._is_measure = False
-    
-    def apply_to(self, tableau: StabilizerTableau):
-        tableau.cnot(self._targets[0], self._targets[1])
+def CNOTGate(ctrl: int, target: int) -> Gate:
+    return Gate(OP_CX, ctrl, target)
+
 
+def MeasureGate(target: int) -> Gate:
+    return Gate(OP_M, target)
 
-class MeasureGate(Gate):
 
-    def __init__(self, target: int):
-        self._name = "M"
-        self._targets = [target]
-        self._is_noisy = False
-        self._is_measure = True
+def apply_many_to_stim(gates: List[Gate], sim: stim.TableauSimulator):
+    """Apply a run of gates with the same opcode to a Stim tableau simulator in place,
+    returning the outcomes if they are measurements."""
 
-    def apply_to(self, tableau: StabilizerTableau) -> bool:
-        return tableau.measure(self._targets[0])
\ No newline at end of file
+    opcode = gates[0].opcode
+    if opcode == OP_H:
+        sim.h(*[gate.t0 for gate in gates])
+    elif opcode == OP_CX:
+        sim.cnot(*[t for gate in gates for t in (gate.t0, gate.t1)])
+    else:
+        return sim.measure_many(*[gate.t0 for gate in gates])
@@ -1,6 +1,7 @@
 import unittest
 import numpy as np
-from deqode.chp_sim import StabilizerTableau
+import stim
+from deqode.chp_sim import StabilizerTableau, OP_H, OP_CX, OP_M
 
 class TestHadamard(unittest.TestCase):
 
@@ -62,6 +63,35 @@ class TestHadamard(unittest.TestCase):
         assert np.all(tableau.matrix == old_matrix)
 
 
+class TestPhase(unittest.TestCase):
+
+    def test_s_squared_equals_z(self):
+        """SS = Z takes |+> to |->, so H SS H |0> should measure 1 deterministically
+        and leave the stabilizer -X behind after H SS."""
+
+        tableau = StabilizerTableau.zero(1)
+        tableau.h(0)
+        tableau.phase(0)
+        tableau.phase(0)
+        target_bmatrix = np.array([
+            [False, True, False],
+            [True, False, True],
+            [False, False, False]
+        ])
+        self.assertTrue(np.all(target_bmatrix == tableau.matrix))
+        tableau.h(0)
+        self.assertTrue(tableau.measure(0))
+
+    def test_s_on_plus_gives_y(self):
+        """S|+> is stabilized by Y, which has both the x and z bits set and a + sign."""
+
+        tableau = StabilizerTableau.zero(2)
+        tableau.h(1)
+        tableau.phase(1)
+        self.assertTrue(tableau.matrix[3, 1] and tableau.matrix[3, 3])
+        self.assertFalse(tableau.matrix[3, -1])
+
+
 class TestCNOT(unittest.TestCase):
 
     def test_cnot_twice_is_id(self):
@@ -80,6 +110,75 @@ class TestCNOT(unittest.TestCase):
         # self.assertTrue(np.all(tableau.matrix == old_matrix))
 
 
+class TestRowsum(unittest.TestCase):
+
+    @staticmethod
+    def g(x1, z1, x2, z2):
+        """The exponent to which i is raised when multiplying the Paulis
+        (x1, z1) and (x2, z2), as defined in the CHP paper."""
+
+        if not x1 and not z1:
+            return 0
+        if x1 and z1:
+            return z2 - x2
+        if x1:
+            return z2 * (2 * x2 - 1)
+        return x2 * (1 - 2 * z2)
+
+    def test_single_qubit_phases(self):
+        """Check every single-qubit pair of Paulis, with every pair of signs,
+        against the reference g. When g is odd the two Paulis anticommute, so a
+        second qubit holding Z and X (for which g is 1) is added to make the
+        rows commute and the sign of the product well defined."""
+
+        for x1, z1, x2, z2, r1, r2 in np.ndindex(2, 2, 2, 2, 2, 2):
+            g = self.g(x1, z1, x2, z2)
+            pad = g % 2
+            bmatrix = np.array([
+                [x1, 0, z1, pad, r1],
+                [x2, pad, z2, 0, r2],
+                [0, 0, 0, 0, 0],
+                [0, 0, 0, 0, 0],
+                [0, 0, 0, 0, 0]
+            ], dtype=bool)
+            tableau = StabilizerTableau(bmatrix)
+            tableau.rowsum(1, 0)
+            expected_r = (2 * r1 + 2 * r2 + g + pad) % 4 != 0
+            self.assertEqual(
+                tableau.matrix[1].tolist(),
+                [bool(x1 ^ x2), bool(pad), bool(z1 ^ z2), bool(pad), expected_r],
+                msg=f"x1={x1} z1={z1} x2={x2} z2={z2} r1={r1} r2={r2}"
+            )
+
+    def test_multi_word_rows_match_stim(self):
+        """With more than one word per row, rowsum should agree with Stim's
+        Pauli string multiplication."""
+
+        n = 100
+        rng = np.random.default_rng(5678)
+        for _ in range(20):
+            while True:
+                paulis = [
+                    stim.PauliString.from_numpy(
+                        xs=rng.integers(0, 2, n).astype(bool),
+                        zs=rng.integers(0, 2, n).astype(bool),
+                        sign=int(rng.choice([-1, 1]))
+                    )
+                    for _ in range(2)
+                ]
+                if paulis[0].commutes(paulis[1]):
+                    break
+            bmatrix = StabilizerTableau.zero(n).matrix
+            for row, pauli in zip((n, n + 1), paulis):
+                xs, zs = pauli.to_numpy()
+                bmatrix[row, :n] = xs
+                bmatrix[row, n:-1] = zs
+                bmatrix[row, -1] = pauli.sign == -1
+            tableau = StabilizerTableau(bmatrix)
+            tableau.rowsum(n + 1, n)
+            self.assertEqual(tableau.to_stim_paulis()[1], paulis[0] * paulis[1])
+
+
 class TestMeasure(unittest.TestCase):
 
     def test_measure_zero_state(self):
@@ -105,6 +204,72 @@ class TestMeasure(unittest.TestCase):
             measure_results.append(not m0 ^ m1)
         self.assertTrue(np.all(np.array(measure_results)))
 
+    def test_measure_keeps_storage_dtypes(self):
+        """Neither the random nor the deterministic branch should change the dtypes of
+        the packed storage, and both should leave the expected stabilizers behind."""
+
+        tableau = StabilizerTableau.zero(2)
+        tableau.h(0)
+        # Random: measuring |+> on qubit 0 leaves the stabilizer (-1)^m Z_0.
+        m = tableau.measure(0)
+        self.assertEqual(tableau._x.dtype, np.uint64)
+        self.assertEqual(tableau._z.dtype, np.uint64)
+        self.assertEqual(tableau._r.dtype, np.uint8)
+        self.assertTrue(np.all(tableau.matrix[2] == [False, False, True, False, m]))
+        # Deterministic: qubit 1 is still |0>, stabilized by +Z_1.
+        self.assertFalse(tableau.measure(1))
+        self.assertEqual(tableau._x.dtype, np.uint64)
+        self.assertEqual(tableau._z.dtype, np.uint64)
+        self.assertEqual(tableau._r.dtype, np.uint8)
+        self.assertTrue(np.all(tableau.matrix[3] == [False, False, False, True, False]))
+        self.assertEqual(tableau.measure(0), m)
+
+    def test_seeded_rng_is_reproducible(self):
+        """Tableaus given identically-seeded generators should give the same random outcomes."""
+
+        outcomes = []
+        for _ in range(2):
+            tableau = StabilizerTableau.zero(8, rng=np.random.default_rng(1234))
+            for i in range(8):
+                tableau.h(i)
+            outcomes.append([tableau.measure(i) for i in range(8)])
+        self.assertEqual(outcomes[0], outcomes[1])
+
+
+class TestBounds(unittest.TestCase):
+    """The kernels do not check indices, so out-of-range arguments must be
+    rejected before they are reached, even when asserts are disabled."""
+
+    def test_gates_reject_out_of_range_qubits(self):
+        tableau = StabilizerTableau.zero(3)
+        with self.assertRaises(IndexError):
+            tableau.cnot(0, 5000000)
+        with self.assertRaises(IndexError):
+            tableau.h(-1)
+        with self.assertRaises(IndexError):
+            tableau.phase(3)
+        with self.assertRaises(IndexError):
+            tableau.measure(3)
+        with self.assertRaises(IndexError):
+            tableau.rowsum(7, 0)
+        with self.assertRaises(ValueError):
+            tableau.cnot(1, 1)
+        self.assertTrue(np.all(tableau.matrix == StabilizerTableau.zero(3).matrix))
+
+    def test_run_rejects_invalid_programs(self):
+        tableau = StabilizerTableau.zero(3)
+        bad_programs = [
+            (IndexError, [[OP_H, 3, -1]]),
+            (IndexError, [[OP_CX, 0, 5000000]]),
+            (IndexError, [[OP_M, -1, -1]]),
+            (ValueError, [[OP_CX, 2, 2]]),
+            (ValueError, [[7, 0, -1]]),
+        ]
+        for error, program in bad_programs:
+            with self.assertRaises(error):
+                tableau.run(np.array(program, dtype=np.int32))
+        self.assertTrue(np.all(tableau.matrix == StabilizerTableau.zero(3).matrix))
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,141 @@
+import unittest
+import numpy as np
+import stim
+from deqode.chp_sim import StabilizerTableau, OP_H, OP_CX, OP_M
+from deqode.circuit import Circuit
+from deqode.gate import HadamardGate, CNOTGate, MeasureGate
+
+def bell_circuit() -> Circuit:
+    circuit = Circuit(2)
+    circuit.append(HadamardGate(0))
+    circuit.append(CNOTGate(0, 1))
+    circuit.append(MeasureGate(0))
+    circuit.append(MeasureGate(1))
+    return circuit
+
+
+class TestGate(unittest.TestCase):
+
+    def test_gates_are_tuples(self):
+        self.assertEqual(tuple(HadamardGate(2)), (OP_H, 2, -1))
+        self.assertEqual(tuple(CNOTGate(0, 1)), (OP_CX, 0, 1))
+        self.assertEqual(repr(CNOTGate(0, 1)), "CX 0 1")
+        self.assertEqual(MeasureGate(1).targets, [1])
+        self.assertTrue(MeasureGate(1).is_measure)
+
+    def test_apply_to_tableau(self):
+        """Applying gates to a tableau should prepare a Bell state and measure equal bits."""
+
+        tableau = StabilizerTableau.zero(2)
+        for gate in [HadamardGate(0), CNOTGate(0, 1)]:
+            gate.apply_to(tableau)
+        self.assertEqual(MeasureGate(0).apply_to(tableau), MeasureGate(1).apply_to(tableau))
+
+
+class TestSample(unittest.TestCase):
+
+    def test_bell_state_stim(self):
+        """Measuring a Bell state should give even-parity bitstrings."""
+
+        for _ in range(100):
+            result = bell_circuit().sample()
+            self.assertEqual(result[0], result[1])
+
+    def test_bell_state_python(self):
+        """The reference tableau backend should agree with Stim."""
+
+        for _ in range(100):
+            result = bell_circuit().sample(backend="python")
+            self.assertEqual(result[0], result[1])
+
+    def test_ghz_state(self):
+        """Runs of Hadamards and CNOTs are batched; a GHZ state should still give all-equal bits."""
+
+        nq = 5
+        for backend in ["stim", "python"]:
+            for _ in range(20):
+                circuit = Circuit(nq)
+                circuit.append(HadamardGate(0))
+                for i in range(nq - 1):
+                    circuit.append(CNOTGate(i, i + 1))
+                for i in range(nq):
+                    circuit.append(MeasureGate(i))
+                result = circuit.sample(backend=backend)
+                self.assertEqual(len(result), nq)
+                self.assertTrue(np.all(result == result[0]))
+
+    def test_sample_shots(self):
+        """Each shot of a Bell circuit should give two equal bits, packed into one byte."""
+
+        for backend in ["stim", "python"]:
+            packed = bell_circuit().sample_shots(200, backend=backend)
+            self.assertEqual(packed.shape, (200, 1))
+            bits = np.unpackbits(packed, axis=1, count=2, bitorder="little")
+            self.assertTrue(np.all(bits[:, 0] == bits[:, 1]))
+            self.assertTrue(0 < bits[:, 0].sum() < 200)
+
+    def test_seeded_rng_is_reproducible(self):
+        """Circuits given identically-seeded generators should give the same samples."""
+
+        def ghz(rng):
+            circuit = Circuit(8, rng=rng)
+            for i in range(8):
+                circuit.append(HadamardGate(i))
+            for i in range(8):
+                circuit.append(MeasureGate(i))
+            return circuit
+
+        for backend in ["stim", "python"]:
+            samples = []
+            for _ in range(2):
+                circuit = ghz(np.random.default_rng(1234))
+                samples.append((
+                    circuit.sample(backend=backend),
+                    circuit.sample_shots(50, backend=backend)
+                ))
+            self.assertTrue(np.all(samples[0][0] == samples[1][0]))
+            self.assertTrue(np.all(samples[0][1] == samples[1][1]))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            bell_circuit().sample(backend="qasm")
+
+
+class TestCompile(unittest.TestCase):
+
+    def test_bell_program(self):
+        program = bell_circuit()._compile()
+        expected = np.array([
+            [OP_H, 0, -1],
+            [OP_CX, 0, 1],
+            [OP_M, 0, -1],
+            [OP_M, 1, -1]
+        ], dtype=np.int32)
+        self.assertEqual(program.dtype, np.int32)
+        self.assertTrue(np.all(program == expected))
+
+    def test_append_invalidates_program(self):
+        circuit = bell_circuit()
+        circuit._compile()
+        circuit.append(MeasureGate(0))
+        self.assertEqual(circuit._compile().shape, (5, 3))
+        self.assertEqual(len(circuit.sample(backend="python")), 3)
+
+
+class TestStimPaulis(unittest.TestCase):
+
+    def test_bell_stabilizers(self):
+        """Both backends should report the stabilizers XX and ZZ for a Bell state."""
+
+        circuit = Circuit(2)
+        circuit.append(HadamardGate(0))
+        circuit.append(CNOTGate(0, 1))
+        circuit.sample()
+        circuit.sample(backend="python")
+        expected = [stim.PauliString("+XX"), stim.PauliString("+ZZ")]
+        self.assertEqual(circuit.to_stim_paulis(), expected)
+        self.assertEqual(circuit._tableau.to_stim_paulis(), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()